@@ -31,13 +31,14 @@ python markdown_image_downloader.py \
 
 """
 import collections
+import concurrent.futures
 import dataclasses
+import functools
 import glob
-import imghdr
-import io
 import os
 import re
 import shutil
+import tempfile
 import textwrap
 import time
 import urllib
@@ -50,6 +51,13 @@ from absl import logging
 import marko
 import requests
 
+# markdown-it-py is an optional dependency; its tokenizer is substantially faster than marko's pure-Python AST
+# parse, so it is preferred for image URL extraction when installed.
+try:
+  import markdown_it
+except ImportError:
+  markdown_it = None
+
 
 _INPUT_PATTERN = flags.DEFINE_string('input_pattern', None, 'Pattern to match input files.', required=True)
 _URL_SUBSTRING_FILTERS = flags.DEFINE_list('url_substring_filters', None,
@@ -69,6 +77,99 @@ _EXECUTION_SUMMARY = flags.DEFINE_string('execution_summary',
 _DRY_RUN = flags.DEFINE_bool('dry_run', False,
                              'If set, prints the plan summary to stdout but does not download images or modify source.'
                              'The same information is saved in --plan_summary as well.')
+_DOWNLOAD_WORKERS = flags.DEFINE_integer('download_workers', 32,
+                                         'The number of concurrent image downloads. Downloads are network-bound, so '
+                                         'raising this can help on runs with many images from a fast host.')
+_STRICT_PARSE = flags.DEFINE_bool('strict_parse', False,
+                                  'If set, image URLs are extracted with a full Markdown parse instead of the default '
+                                  'regex scan for the standard ![alt](url) form. The regex covers Roam/Logseq exports; '
+                                  'set this if your Markdown uses more exotic image syntax.')
+
+
+def build_download_session(pool_size: int = 32) -> requests.Session:
+  """Builds a requests Session with connection pooling and retries for image downloads.
+
+  Most images live on a single host (e.g. Firebase storage), so pooling connections across downloads avoids
+  paying the TCP+TLS handshake cost per image. Transient server errors are retried with backoff.
+
+  Args:
+    pool_size: The connection pool size. This should match the number of concurrent downloads.
+  """
+  session = requests.Session()
+  retry = requests.packages.urllib3.util.retry.Retry(total=3, backoff_factor=0.3, status_forcelist=[502, 503, 504])
+  adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size,
+                                          pool_maxsize=pool_size,
+                                          max_retries=retry)
+  session.mount('https://', adapter)
+  session.mount('http://', adapter)
+  return session
+
+
+# The number of files handed to an analysis worker process at a time. Markdown files are small, so batching
+# amortizes the per-task serialization cost.
+_ANALYSIS_CHUNKSIZE = 32
+
+# The number of leading bytes needed to determine an image's file type from its magic bytes.
+_IMAGE_MAGIC_BYTES_LEN = 32
+
+# The buffer size for streaming downloaded image data to disk. shutil.copyfileobj defaults to 64 KiB chunks;
+# a 1 MiB buffer cuts the per-chunk Python and syscall overhead for typical image sizes.
+_DOWNLOAD_BUFFER_BYTES = 1 << 20
+
+# A map from image Content-Type to the file extension to use for it.
+_CONTENT_TYPE_EXTENSIONS = {
+    'image/jpeg': 'jpg',
+    'image/png': 'png',
+    'image/gif': 'gif',
+    'image/webp': 'webp',
+    'image/bmp': 'bmp',
+}
+
+
+def probe_image_ext(url: str, session: requests.Session) -> Optional[str]:
+  """Probes the image file extension of a URL with a HEAD request.
+
+  Args:
+    url: The image URL.
+    session: The requests Session to probe with.
+
+  Returns:
+    The file extension without the '.', or None if the request fails or the Content-Type is not a recognized
+    image type.
+  """
+  try:
+    response = session.head(url, allow_redirects=True)
+  except requests.RequestException:
+    return None
+  if response.status_code != 200:
+    return None
+  content_type = response.headers.get('Content-Type', '').split(';')[0].strip().lower()
+  return _CONTENT_TYPE_EXTENSIONS.get(content_type)
+
+
+def sniff_image_ext(head: bytes) -> Optional[str]:
+  """Determines an image file extension from the leading magic bytes of its data.
+
+  This covers the image formats encountered in practice (jpg, png, gif, webp, bmp) and replaces the deprecated
+  imghdr module, which runs a chain of Python-level tests per format.
+
+  Args:
+    head: The leading bytes of the image data (at least _IMAGE_MAGIC_BYTES_LEN bytes for a reliable answer).
+
+  Returns:
+    The file extension without the '.', or None if the data is not a recognized image format.
+  """
+  if head[:3] == b'\xff\xd8\xff':
+    return 'jpg'
+  if head[:8] == b'\x89PNG\r\n\x1a\n':
+    return 'png'
+  if head[:6] in (b'GIF87a', b'GIF89a'):
+    return 'gif'
+  if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+    return 'webp'
+  if head[:2] == b'BM':
+    return 'bmp'
+  return None
 
 
 def build_url_dest_regex(url):
@@ -76,58 +177,201 @@ def build_url_dest_regex(url):
   return f'\(\s*{re.escape(url)}\s*\)'
 
 
+def build_multi_url_dest_pattern(urls: Sequence[str]) -> re.Pattern:
+  """Builds a compiled pattern matching any of the given literal URLs surrounded by ()'s, capturing the URL.
+
+  Callers should order urls longest-first so that the alternation prefers the longest match in the edge case
+  where one URL is a prefix of another.
+  """
+  return re.compile('\(\s*(' + '|'.join(re.escape(url) for url in urls) + ')\s*\)')
+
+
 def collect_image_elements(element) -> Sequence[marko.inline.Image]:
-  """Collects all descendent images of an element."""
-  if isinstance(element, marko.inline.Image):
-    return [element]
-  elif hasattr(element, 'children'):
-    imgs = []
-    for child in element.children:
-      imgs += collect_image_elements(child)
-    return imgs
-  else:
-    return []
+  """Collects all descendent images of an element.
 
+  The traversal is iterative with an explicit stack, which avoids per-node Python call overhead and the
+  recursion limit on pathologically nested documents.
+  """
+  imgs = []
+  stack = [element]
+  while stack:
+    element = stack.pop()
+    if isinstance(element, marko.inline.Image):
+      imgs.append(element)
+    elif hasattr(element, 'children') and not isinstance(element.children, str):
+      stack.extend(element.children)
+  return imgs
 
-def get_image_url_counts(md_source: str) -> Mapping[str, int]:
-  """Gets the occurrence count of each image URL in a Markdown source."""
-  parser = marko.parser.Parser()
-  doc = parser.parse(md_source)
-  imgs = collect_image_elements(doc)
 
-  # Filter out image elements that do not have URL destinations.
-  imgs = [img for img in imgs if img.dest.startswith('http')]
+# Matches the standard ![alt](url) Markdown image form with an http(s) destination, capturing the URL with any
+# surrounding whitespace stripped.
+_IMAGE_URL_RE = re.compile(r'!\[[^\]]*\]\(\s*(https?://\S+?)\s*\)')
+
+
+def _get_markdown_it_image_urls(md_source: str) -> List[str]:
+  """Gets all image destination URLs in a Markdown source using the markdown-it-py tokenizer.
+
+  markdown-it-py emits a flat token stream with image destinations in token attributes, so no AST needs to be
+  built or walked.
+  """
+  global _shared_markdown_it
+  if _shared_markdown_it is None:
+    _shared_markdown_it = markdown_it.MarkdownIt()
+  urls = []
+  for token in _shared_markdown_it.parse(md_source):
+    if token.children:
+      urls += [child.attrs.get('src', '') for child in token.children if child.type == 'image']
+  return urls
+
+
+def get_image_url_counts(md_source: str,
+                         parser: marko.parser.Parser = None,
+                         strict: bool = False) -> Mapping[str, int]:
+  """Gets the occurrence count of each image URL in a Markdown source.
+
+  By default image URLs are detected with a single regex scan for the standard ![alt](url) form, which is the
+  only form produced by Roam/Logseq exports and avoids building a parse tree per file. A full Markdown parse
+  is available behind the strict argument for sources using more exotic image syntax.
+
+  Args:
+    md_source: The Markdown source.
+    parser: An optional marko parser to use for strict parsing. Parser construction is not cheap, so callers
+      parsing many sources should pass the same instance for each. If None, a new parser is created. Ignored
+      when markdown-it-py is installed, in which case its faster tokenizer is used instead.
+    strict: If true, extract image URLs with a full Markdown parse instead of the regex scan.
+  """
+  if not strict:
+    return collections.Counter(_IMAGE_URL_RE.findall(md_source))
+
+  if markdown_it is not None:
+    urls = _get_markdown_it_image_urls(md_source)
+  else:
+    if parser is None:
+      parser = marko.parser.Parser()
+    doc = parser.parse(md_source)
+    urls = [img.dest for img in collect_image_elements(doc)]
 
-  return collections.Counter([img.dest for img in imgs])
+  # Filter out image elements that do not have URL destinations.
+  return collections.Counter([url for url in urls if url.startswith('http')])
 
 
-def get_textual_counts(md_source: str, urls: Iterable[str]) -> Mapping[str, int]:
+def get_textual_counts(md_source: str,
+                       urls: Iterable[str],
+                       image_url_counts: Mapping[str, int]) -> Mapping[str, int]:
   """Gets the number of textual occurrences of a set of URLs in a Markdown file.
 
   This matches instances of the regex '\(\s*URL\s*\)' where 'URL' is the URL in question.
   In other words, this matches instances of URLs which are wrapped in ()'s with some whitespace allowed.
 
+  A plain substring count is used as a fast pre-filter: it is an upper bound on the pattern count, and the
+  image element count is a lower bound, so when the two bounds agree the regex scan can be skipped entirely.
+  The URLs that do need a regex scan are matched together in one alternation pass over the source rather than
+  one sweep per URL.
+
   Args:
     md_source: The Markdown source.
     urls: URLs for which to count occurrences.
+    image_url_counts: A map from URL to its image element count in this source (see get_image_url_counts).
 
   Returns:
     The occurrence count for each given URL.
   """
   url_textual_counts = {}
+  urls_needing_scan = []
   for url in urls:
-    url_textual_counts[url] = len(re.findall(build_url_dest_regex(url), md_source))
-    # url_textual_counts[url] = md_source.count(url)
+    substring_count = md_source.count(url)
+    if substring_count == image_url_counts[url]:
+      url_textual_counts[url] = substring_count
+    else:
+      urls_needing_scan.append(url)
+
+  if urls_needing_scan:
+    # Sort longest-first so the alternation prefers the longest match when one URL is a prefix of another.
+    urls_needing_scan.sort(reverse=True, key=len)
+    scan_counts = collections.Counter(build_multi_url_dest_pattern(urls_needing_scan).findall(md_source))
+    for url in urls_needing_scan:
+      url_textual_counts[url] = scan_counts[url]
   return url_textual_counts
 
 
+# The parsers shared within one process, created on first use.
+_shared_parser = None
+_shared_markdown_it = None
+
+
+def _get_shared_parser() -> marko.parser.Parser:
+  """Gets the per-process shared parser, creating it on first use."""
+  global _shared_parser
+  if _shared_parser is None:
+    _shared_parser = marko.parser.Parser()
+  return _shared_parser
+
+
+def analyze_md_file(filepath: str,
+                    url_substring_filters: Sequence[str] = None,
+                    strict_parse: bool = False) -> Optional[Tuple[str, Mapping[str, int], Mapping[str, int]]]:
+  """Reads a Markdown file and counts its image URL occurrences.
+
+  This is a module-level function with no plan state so that analysis can be distributed to worker processes.
+
+  Args:
+    filepath: The Markdown filepath to analyze.
+    url_substring_filters: If provided, files containing none of the substrings are ruled out with a plain
+      substring scan before the comparatively expensive parse. In a typical vault this skips the vast majority
+      of files.
+    strict_parse: See get_image_url_counts.
+
+  Returns:
+    (filepath, image_url_counts, url_textual_counts), or None if the file was ruled out by the filters.
+  """
+  with open(filepath, 'r') as f:
+    md_source = f.read()
+
+  if url_substring_filters and not any(sub in md_source for sub in url_substring_filters):
+    return None
+
+  image_url_counts = get_image_url_counts(md_source, parser=_get_shared_parser(), strict=strict_parse)
+  url_textual_counts = get_textual_counts(md_source, image_url_counts.keys(), image_url_counts)
+  return filepath, image_url_counts, url_textual_counts
+
+
 class LogseqImageFilenameTransformer:
   """Assigns unique, local image filenames in the Logseq style."""
 
+  # Matches a filename root ending in a '_<n>' uniquifying suffix.
+  _SUFFIXED_ROOT_RE = re.compile(r'^(.*)_(\d+)$')
+
   def __init__(self, existing_filenames: Sequence[str] = set()):
     """Initializes with a set of existing filenames to avoid duplicates."""
     self._existing_filename_roots = {os.path.splitext(os.path.basename(fn))[0] for fn in existing_filenames}
 
+    # The epoch appended to filenames is computed once; all filenames assigned by one run share it, and the
+    # uniquifying suffix provides the actual uniqueness.
+    self._epoch = int(time.time())
+
+    self._seed_next_suffixes()
+
+  @classmethod
+  def from_existing_filename_roots(cls, existing_filename_roots: Iterable[str]) -> 'LogseqImageFilenameTransformer':
+    """Creates a transformer from a prebuilt set of filename roots (basenames without extension)."""
+    transformer = cls()
+    transformer._existing_filename_roots = set(existing_filename_roots)
+    transformer._seed_next_suffixes()
+    return transformer
+
+  def _seed_next_suffixes(self):
+    """Builds the next unused uniquifying suffix per filename root from the existing roots.
+
+    Probing always starts at the seeded suffix rather than at 0, which keeps assignment O(1) when many
+    filenames share a root.
+    """
+    self._next_unique_suffix = collections.defaultdict(int)
+    for existing_root in self._existing_filename_roots:
+      match = self._SUFFIXED_ROOT_RE.match(existing_root)
+      if match:
+        root, suffix = match.group(1), int(match.group(2))
+        self._next_unique_suffix[root] = max(self._next_unique_suffix[root], suffix + 1)
+
   def get_uniquified_filename(self, filename: str) -> Tuple[str, str]:
     """Creates a unique filename given an original filename.
 
@@ -147,11 +391,13 @@ class LogseqImageFilenameTransformer:
       A transformed filename root which is unique within the set of pre-existing files as (root, ext).
     """
     root, ext = os.path.splitext(filename)
-    root.replace(' ', '_')
-    root += '_' + str(int(time.time()))
+    root = root.replace(' ', '_')
+    root += '_' + str(self._epoch)
     ext = ext.replace('.', '')  # For consistency elsewhere, we store the extension without the ".".
 
-    candidate_unique_suffix = 0
+    # Start probing at the next suffix known to be unused for this root; membership is still checked as a
+    # safety net against existing filenames that were not assigned by this transformer.
+    candidate_unique_suffix = self._next_unique_suffix[root]
     while True:
       candidate_filename_root = f'{root}_{candidate_unique_suffix}'
       if candidate_filename_root not in self._existing_filename_roots:
@@ -164,6 +410,8 @@ class LogseqImageFilenameTransformer:
     """Assigns a unique filename and records the filename root in the existing set."""
     root, ext = self.get_uniquified_filename(filename)
     self._existing_filename_roots.add(root)
+    base_root, suffix = self._SUFFIXED_ROOT_RE.match(root).groups()
+    self._next_unique_suffix[base_root] = int(suffix) + 1
     return root, ext
 
 
@@ -198,63 +446,65 @@ class ImageUrlRecord:
   local_ext: str = ''
   download_successful: bool = False
   file_occurrences: List[FileOccurrenceRecord] = dataclasses.field(default_factory=list)
+  # An index of file_occurrences by filepath for O(1) lookup.
+  _occurrences_by_filepath: Mapping[str, FileOccurrenceRecord] = dataclasses.field(default_factory=dict, repr=False)
 
   def local_filename(self):
     """Gets the local filename for this image."""
     return f'{self.local_basename}.{self.local_ext}' if self.local_ext else self.local_basename
 
+  def add_file_occurrence(self, file_occurrence: FileOccurrenceRecord):
+    """Records an occurrence of this image URL in a file."""
+    self.file_occurrences.append(file_occurrence)
+    self._occurrences_by_filepath[file_occurrence.filepath] = file_occurrence
+
   def get_file_occurrence(self, filepath) -> Optional[FileOccurrenceRecord]:
     """Gets the file occurrence record for this image URL the given filepath."""
-    for file_occurrence in self.file_occurrences:
-      if file_occurrence.filepath == filepath:
-        return file_occurrence
-    return None
+    return self._occurrences_by_filepath.get(filepath)
 
-  def download(self, local_dir: str):
+  def download(self, local_dir: str, session: requests.Session = None):
     """Downloads the image and saves in local_dir.
 
     Args:
       local_dir: The destination of the downloaded image file.
+      session: An optional requests Session to use for the download. Sharing a session across downloads reuses
+        pooled connections. If None, a new session is created for this download.
     """
     if not local_dir:
       raise ValueError('local_dir is empty in ImageUrlRecord.download_image.')
     if not self.local_basename:
       raise ValueError('ImageUrlRecord does not have an assigned local_basename.')
-
-    # If the file extension is known from the URL, we stream the image data directly to the local file.
-    if self.local_ext:
-      logging.info('Downloading %s by streaming to file...', self.url)
-      response = requests.get(self.url, stream=True, allow_redirects=True)
-      if response.status_code != 200:
-        logging.error('Failed downloading %s with status $d.', self.url, response.status_code)
-        return
-      response.raw.decode_content = True
-
-      image_file = response.raw
-
-    # If the file extension is not known, we download the image in memory first, inspect the image data to determine
-    # the correct file extension, and then save the image data to disk.
-    else:
-      logging.info('Downloading %s in-memory...', self.url)
-      response = requests.get(self.url, stream=False, allow_redirects=True)
-      if response.status_code != 200:
-        logging.error('Failed downloading %s with status $d.', self.url, response.status_code)
-        return
-
-      # Determine the image file extension.
-      ext = imghdr.what(None, h=response.content)
+    if session is None:
+      session = build_download_session()
+
+    # If the file extension is not known from the URL, a cheap HEAD request can usually determine it from the
+    # Content-Type header. Failing that, it is sniffed from the magic bytes of the response below.
+    if not self.local_ext:
+      self.local_ext = probe_image_ext(self.url, session) or ''
+
+    logging.info('Downloading %s...', self.url)
+    response = session.get(self.url, stream=True, allow_redirects=True)
+    if response.status_code != 200:
+      logging.error('Failed downloading %s with status %d.', self.url, response.status_code)
+      return
+    response.raw.decode_content = True
+
+    # If the file extension is not known from the URL, peek at the leading bytes of the response to determine it.
+    # Only the magic bytes are needed, so the image never has to be held in memory whole; the peeked bytes are
+    # written out ahead of the rest of the stream below.
+    head = response.raw.read(_IMAGE_MAGIC_BYTES_LEN)
+    if not self.local_ext:
+      ext = sniff_image_ext(head)
       if ext is None:
         logging.error('Download %s is not an image.', self.url)
         return
-      # Set the extension, but prefer 'jpg' in place of 'jpeg'
-      self.local_ext = ext if ext != 'jpeg' else 'jpg'
-
-      image_file = io.BytesIO(response.content)
+      self.local_ext = ext
 
-    # Save image file.
+    # Save image file by streaming the response directly to disk.
     local_filepath = os.path.join(local_dir, self.local_filename())
     with open(local_filepath, 'wb') as f:
-        shutil.copyfileobj(image_file, f)
+        f.write(head)
+        shutil.copyfileobj(response.raw, f, length=_DOWNLOAD_BUFFER_BYTES)
     self.download_successful = True
 
   def __str__(self):
@@ -272,46 +522,73 @@ class ImageUrlReplacementPlan:
                md_filepaths: Sequence[str],
                image_dest_dir: str ,
                markdown_dest_dir: str,
-               url_substring_filters: Sequence[str] = None):
+               url_substring_filters: Sequence[str] = None,
+               download_workers: int = 32,
+               strict_parse: bool = False):
     self.md_filepaths = md_filepaths
     self.url_substring_filters = url_substring_filters
     self.image_dest_dir = image_dest_dir
     self.markdown_dest_dir = markdown_dest_dir
+    self.download_workers = download_workers
+    self.strict_parse = strict_parse
 
     # A map from image URL to its ImageUrlRecord.
     self.image_url_records = {}
+    # A cache of the by-file grouping built by _get_image_url_records_by_file, keyed by its filtered argument.
+    # The grouping is requested by several methods and the records are fully built by the end of __init__, so it
+    # is safe to compute once.
+    self._records_by_file_cache = {}
 
     # Collect image URLs by analyzing the Markdown source.
     self._get_image_url_occurrences()
+    # The record set is complete once analysis is done, so the deterministic iteration order is sorted once
+    # here rather than on every call to _iterate_image_url_records.
+    self._sorted_image_url_records = tuple(sorted(self.image_url_records.values(), key=lambda x: x.url))
     # Assign unique local filenames for each image.
     self._assign_local_filenames()
 
   def execute(self):
     """Executes image downloading and reference replacement."""
-    # Download all images first.
-    for img in self._iterate_image_url_records():
-      img.download(self.image_dest_dir)
+    # Download all images first. Downloads are almost entirely network-bound, so running them on a thread pool
+    # overlaps the per-image latencies rather than paying them serially. Each download writes only to its own
+    # ImageUrlRecord, so no synchronization is needed beyond joining the pool. A single session is shared so
+    # that downloads reuse pooled connections (requests Sessions are thread-safe for this usage).
+    session = build_download_session(pool_size=self.download_workers)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=self.download_workers) as executor:
+      list(executor.map(lambda img: img.download(self.image_dest_dir, session=session),
+                        self._iterate_image_url_records()))
 
     # Replace image URLs in all Markdown files where it is possible.
     for filepath, image_url_records in self._get_image_url_records_by_file():
+      # Collect the URLs in this file that can be replaced. Files with nothing to replace are skipped without
+      # being read or rewritten.
+      replaceable_imgs = [img for img in image_url_records
+                          if img.download_successful and not img.get_file_occurrence(filepath).replacement_unsafe()]
+      if not replaceable_imgs:
+        continue
+
       logging.info('Replacing URLs in file %s...', filepath)
       with open(filepath, 'r') as f:
         md_source = f.read()
 
-      # Sort in reverse order of URL length. Replacing URLs in the order guards against the edge case where a URL is a
-      # substring of another.
-      image_url_records.sort(reverse=True, key=lambda x: len(x.url))
-
-      # For each URL in this file, check if we can replace it and do so if possible.
-      for img in image_url_records:
-        file_occurrence = img.get_file_occurrence(filepath)
-        if img.download_successful and not file_occurrence.replacement_unsafe():
-          replacement = f'({os.path.join(self.markdown_dest_dir, img.local_filename())})'
-          md_source = re.sub(build_url_dest_regex(img.url), replacement, md_source)
-          file_occurrence.replace_successful = True
-
-      with open(filepath, 'w') as f:
-        f.write(md_source)
+      # Replace all URLs in a single pass with one alternation pattern, rather than one full sweep of the source
+      # per URL. Sorting in reverse order of URL length guards against the edge case where a URL is a prefix of
+      # another, since the alternation tries URLs in the given order.
+      replaceable_imgs.sort(reverse=True, key=lambda x: len(x.url))
+      replacements = {img.url: f'({os.path.join(self.markdown_dest_dir, img.local_filename())})'
+                      for img in replaceable_imgs}
+      multi_url_pattern = build_multi_url_dest_pattern([img.url for img in replaceable_imgs])
+      new_md_source = multi_url_pattern.sub(lambda match: replacements[match.group(1)], md_source)
+      for img in replaceable_imgs:
+        img.get_file_occurrence(filepath).replace_successful = True
+
+      # Only write the file back when the source actually changed, and write through a temporary file in the
+      # same directory swapped in with os.replace, so an interrupted write cannot truncate the original.
+      if new_md_source != md_source:
+        with tempfile.NamedTemporaryFile('w', dir=os.path.dirname(filepath), delete=False) as f:
+          f.write(new_md_source)
+        os.chmod(f.name, os.stat(filepath).st_mode)
+        os.replace(f.name, filepath)
 
   def get_execution_plan_string(self) -> str:
     """Returns a detailed description of Markdown editing actions that are planned."""
@@ -388,41 +665,52 @@ class ImageUrlReplacementPlan:
 
   def _get_image_url_occurrences(self):
     """Analyzes Markdown files and collects image URLs to download and replace."""
-    for filepath in self.md_filepaths:
-      with open(filepath, 'r') as f:
-        md_source = f.read()
-
-      # Counts the number of times each image URL occurs in this file.
-      image_url_counts = get_image_url_counts(md_source)
-      url_textual_counts = get_textual_counts(md_source, image_url_counts.keys())
-
-      for url, textual_count in url_textual_counts.items():
-        # We track whether there are instances of the URL in the file which are outside of an image element. Such
-        # "num_extra_textual_occurrences" mean that simply replacing the URL with the local filepath may make an
-        # undesired edit.
-        num_image_elements = image_url_counts[url]
-        num_extra_textual_occurrences = textual_count - num_image_elements
-
-        # Add a record of this image URL if it has not been seen before.
-        if url not in self.image_url_records:
-          raw_path = urllib.parse.urlparse(url).path
-          unquoted_path = urllib.parse.unquote(raw_path)
-          original_filename = os.path.basename(unquoted_path)
-          self.image_url_records[url] = ImageUrlRecord(
-              url=url,
-              passes_filters=self._check_passes_filters(url),
-              original_filename=original_filename)
-
-        # Record the occurrence of this image URL in this file.
-        self.image_url_records[url].file_occurrences.append(
-          FileOccurrenceRecord(filepath=filepath,
-                               num_image_elements=num_image_elements,
-                               num_extra_textual_occurrences=num_extra_textual_occurrences))
+    # Markdown parsing is pure-Python and CPU-bound, so per-file analysis (read, filter, parse, count) is
+    # distributed across worker processes and the results are merged into the records here. This also subsumes
+    # the read/parse overlap previously provided by a thread pool.
+    analyze = functools.partial(analyze_md_file,
+                                url_substring_filters=self.url_substring_filters,
+                                strict_parse=self.strict_parse)
+    with concurrent.futures.ProcessPoolExecutor() as executor:
+      for result in executor.map(analyze, self.md_filepaths, chunksize=_ANALYSIS_CHUNKSIZE):
+        if result is None:
+          continue
+        self._record_file_analysis(*result)
+
+  def _record_file_analysis(self, filepath: str,
+                            image_url_counts: Mapping[str, int],
+                            url_textual_counts: Mapping[str, int]):
+    """Merges the analysis results of one Markdown file (see analyze_md_file) into the records."""
+    for url, textual_count in url_textual_counts.items():
+      # We track whether there are instances of the URL in the file which are outside of an image element. Such
+      # "num_extra_textual_occurrences" mean that simply replacing the URL with the local filepath may make an
+      # undesired edit.
+      num_image_elements = image_url_counts[url]
+      num_extra_textual_occurrences = textual_count - num_image_elements
+
+      # Add a record of this image URL if it has not been seen before.
+      if url not in self.image_url_records:
+        raw_path = urllib.parse.urlparse(url).path
+        unquoted_path = urllib.parse.unquote(raw_path)
+        original_filename = os.path.basename(unquoted_path)
+        self.image_url_records[url] = ImageUrlRecord(
+            url=url,
+            passes_filters=self._check_passes_filters(url),
+            original_filename=original_filename)
+
+      # Record the occurrence of this image URL in this file.
+      self.image_url_records[url].add_file_occurrence(
+        FileOccurrenceRecord(filepath=filepath,
+                             num_image_elements=num_image_elements,
+                             num_extra_textual_occurrences=num_extra_textual_occurrences))
 
   def _assign_local_filenames(self):
     """Assigns unique image filenames to every image."""
-    exiting_dir_contents = os.listdir(self.image_dest_dir)
-    fn_transformer = LogseqImageFilenameTransformer(exiting_dir_contents)
+    # os.scandir yields entries with the name cached and the file type available without an extra stat, which
+    # is noticeably cheaper than os.listdir + basename on large assets directories.
+    existing_filename_roots = {os.path.splitext(entry.name)[0]
+                               for entry in os.scandir(self.image_dest_dir) if entry.is_file()}
+    fn_transformer = LogseqImageFilenameTransformer.from_existing_filename_roots(existing_filename_roots)
     for img in self._iterate_image_url_records():
       img.local_basename, img.local_ext = fn_transformer.assign_uniquified_filename(img.original_filename)
 
@@ -437,15 +725,16 @@ class ImageUrlReplacementPlan:
 
   def _iterate_image_url_records(self, filtered: bool = True):
     """Iterates all ImageUrlRecords in a deterministic order."""
-    # Sort to get a deterministic order.
-    img_records = sorted(list(self.image_url_records.values()), key=lambda x: x.url)
-    for img in img_records:
+    for img in self._sorted_image_url_records:
       if filtered and not img.passes_filters:
         continue
       yield img
 
   def _get_image_url_records_by_file(self, filtered: bool = True):
     """Iterates all (filepath, image_url_records) in a deterministic order."""
+    if filtered in self._records_by_file_cache:
+      return self._records_by_file_cache[filtered]
+
     imgs_grouped_by_file = collections.defaultdict(list)
     for img in self._iterate_image_url_records(filtered=filtered):
       for file_occurrence in img.file_occurrences:
@@ -454,7 +743,8 @@ class ImageUrlReplacementPlan:
     # Sort to get a deterministic order.
     for url, imgs in imgs_grouped_by_file.items():
       imgs.sort(key=lambda x: x.url)
-    return sorted(list(imgs_grouped_by_file.items()), key=lambda x: x[0])
+    self._records_by_file_cache[filtered] = sorted(list(imgs_grouped_by_file.items()), key=lambda x: x[0])
+    return self._records_by_file_cache[filtered]
 
   def __str__(self):
     print_str = ''
@@ -478,7 +768,9 @@ def main(argv: Sequence[str]) -> None:
     glob.glob(_INPUT_PATTERN.value),
     _IMAGE_DEST_DIR.value,
     _MARKDOWN_DEST_DIR.value,
-    url_substring_filters=_URL_SUBSTRING_FILTERS.value)
+    url_substring_filters=_URL_SUBSTRING_FILTERS.value,
+    download_workers=_DOWNLOAD_WORKERS.value,
+    strict_parse=_STRICT_PARSE.value)
 
   # Create a plan summary and save it.
   plan_summary = replacement_plan.get_execution_plan_string()